@@ -2,80 +2,207 @@
 A module for encoding and decoding data in the bencode format.
 
 This module implements functions for working with bencode, including encoding and decoding strings (UTF-8 support), integers, lists, and dictionaries from stream or bytes.
+Decoded strings are returned as bytes, callers decode the fields they know to be text.
 Bencode is a serialization format used in BitTorrent.
 """
 
-from io import SEEK_SET, SEEK_CUR, BufferedReader, BytesIO
+from io import SEEK_SET, BufferedReader, BytesIO
 from pathlib import Path
 
+try:
+    # only the C extension is worth using: the package silently falls back to
+    # a byte-by-byte pure Python decoder, and some builds fail on every call
+    from better_bencode import _fast as better_bencode
+
+    better_bencode.loads(b"de")
+except Exception:
+    better_bencode = None
+
+try:
+    from bencode_fast import decode as decode_fast
+except ImportError:
+    try:
+        from bencode_numba import decode as decode_fast
+    except ImportError:
+        decode_fast = None
+
 type SupportedTypes = int | str | list[SupportedTypes] | dict[
-    str, SupportedTypes
+    str | bytes, SupportedTypes
 ] | bytes
 
 
 def encode(value: SupportedTypes) -> bytes:
-    if isinstance(value, int):
-        return encode_int(value)
-    elif isinstance(value, str):
-        return encode_str(value)
-    elif isinstance(value, list):
-        return encode_list(value)
-    elif isinstance(value, dict):
-        return encode_dict(value)
-    elif isinstance(value, bytes):
-        return encode_bytes(value)
-    raise TypeError(f"Unsupported type: {type(value)}")
+    buf = bytearray()
+    _encode_into(value, buf)
+    return bytes(buf)
 
 
 def encode_str(value: str) -> bytes:
-    if not isinstance(value, str):
-        raise TypeError(f"Expected str, got {type(value)}")
     encoded = value.encode()
-    return str(len(encoded)).encode() + b":" + encoded
+    return b"%d:%b" % (len(encoded), encoded)
 
 
 def encode_int(value: int) -> bytes:
-    if not isinstance(value, int):
-        raise TypeError(f"Expected int, got {type(value)}")
-    return f"i{value}e".encode()
+    return b"i%de" % value
 
 
 def encode_list(value: list[SupportedTypes]) -> bytes:
-    if not isinstance(value, list):
-        raise TypeError(f"Expected list, got {type(value)}")
-    return b"l" + b"".join([encode(v) for v in value]) + b"e"
+    buf = bytearray()
+    _encode_list_into(value, buf)
+    return bytes(buf)
 
 
 def encode_dict(value: dict[str, SupportedTypes]) -> bytes:
-    if not isinstance(value, dict):
-        raise TypeError(f"Expected a dictionary, got {type(value)}")
-    buf = b"d"
-    for key, val in sorted(value.items()):
-        buf += encode(key)
-        buf += encode(val)
-    return buf + b"e"
+    buf = bytearray()
+    _encode_dict_into(value, buf)
+    return bytes(buf)
 
 
 def encode_bytes(value: bytes) -> bytes:
-    if not isinstance(value, bytes):
-        raise TypeError(f"Expected bytes, got {type(value)}")
-    return f"{len(value)}:".encode() + value
+    return b"%d:%b" % (len(value), value)
+
+
+def _encode_into(value: SupportedTypes, buf: bytearray) -> None:
+    encoder = _ENCODERS.get(type(value))
+    if encoder is None:
+        raise TypeError(f"Unsupported type: {type(value)}")
+    encoder(value, buf)
+
+
+def _encode_str_into(value: str, buf: bytearray) -> None:
+    encoded = value.encode()
+    buf += b"%d:%b" % (len(encoded), encoded)
+
+
+def _encode_int_into(value: int, buf: bytearray) -> None:
+    buf += b"i%de" % value
+
+
+def _encode_list_into(value: list[SupportedTypes], buf: bytearray) -> None:
+    buf += b"l"
+    encode_into = _encode_into
+    for v in value:
+        encode_into(v, buf)
+    buf += b"e"
+
+
+def _encode_dict_into(value: dict[str, SupportedTypes], buf: bytearray) -> None:
+    buf += b"d"
+    encode_into = _encode_into
+    order = _KNOWN_KEY_ORDERS.get(frozenset(value))
+    items = [(k, value[k]) for k in order] if order else sorted(value.items())
+    for key, val in items:
+        encode_into(key, buf)
+        encode_into(val, buf)
+    buf += b"e"
+
+
+def _encode_bytes_into(value: bytes, buf: bytearray) -> None:
+    buf += b"%d:%b" % (len(value), value)
+
+
+# KRPC messages use a few fixed key sets, emit them without sorting
+_KNOWN_KEY_ORDERS = {
+    frozenset({"a", "q", "t", "y"}): ("a", "q", "t", "y"),
+    frozenset({"r", "t", "y"}): ("r", "t", "y"),
+    frozenset({"e", "t", "y"}): ("e", "t", "y"),
+    frozenset({"id"}): ("id",),
+    frozenset({"id", "target"}): ("id", "target"),
+    frozenset({"id", "nodes"}): ("id", "nodes"),
+}
+
+_ENCODERS = {
+    int: _encode_int_into,
+    bool: _encode_int_into,
+    str: _encode_str_into,
+    list: _encode_list_into,
+    dict: _encode_dict_into,
+    bytes: _encode_bytes_into,
+}
+
+
+def _decode_length(data: bytes, pos: int) -> tuple[int, int]:
+    try:
+        colon = data.index(b":", pos)
+    except ValueError:
+        raise ValueError("Unterminated string length") from None
+    return int(data[pos:colon]), colon + 1
+
+
+def _decode_str(data: bytes, pos: int) -> tuple[str, int]:
+    value, end = _decode_bytes(data, pos)
+    return value.decode(), end
+
+
+def _decode_bytes(data: bytes, pos: int) -> tuple[bytes, int]:
+    length, start = _decode_length(data, pos)
+    end = start + length
+    if end > len(data):
+        raise ValueError("Unexpected end of file")
+    return data[start:end], end
+
+
+def _decode_int(data: bytes, pos: int) -> tuple[int, int]:
+    try:
+        end = data.index(b"e", pos)
+    except ValueError:
+        raise ValueError("Unterminated integer") from None
+    return int(data[pos:end]), end + 1
+
+
+def _decode_list(data: bytes, pos: int) -> tuple[list[SupportedTypes], int]:
+    items = []
+    append = items.append
+    decode = _decode
+    while data[pos : pos + 1] != b"e":
+        item, pos = decode(data, pos)
+        append(item)
+    return items, pos + 1
+
+
+def _decode_dict(data: bytes, pos: int) -> tuple[dict[bytes, SupportedTypes], int]:
+    items = {}
+    decode = _decode
+    while (byte := data[pos : pos + 1]) != b"e":
+        if not byte:
+            raise ValueError("Unexpected end of file")
+        if not byte.isdigit():
+            raise ValueError("Invalid dictionary key")
+        key, pos = _decode_bytes(data, pos)
+        value, pos = decode(data, pos)
+        items[key] = value
+    return items, pos + 1
+
+
+def _decode(data: bytes, pos: int) -> tuple[SupportedTypes, int]:
+    byte = data[pos : pos + 1]
+    if not byte:
+        raise ValueError("Unexpected end of file")
+    if byte == b"i":
+        return _decode_int(data, pos + 1)
+    elif byte == b"l":
+        return _decode_list(data, pos + 1)
+    elif byte == b"d":
+        return _decode_dict(data, pos + 1)
+    elif byte.isdigit():
+        return _decode_bytes(data, pos)
+    else:
+        raise ValueError(f"Invalid bencode byte: {byte}")
+
+
+def _decode_stream(stream: BytesIO | BufferedReader, decoder, pos: int = 0):
+    # read the remaining stream at once and rewind it past the decoded value
+    start = stream.tell()
+    data = stream.read()
+    value, end = decoder(data, pos)
+    stream.seek(start + end, SEEK_SET)
+    return value
 
 
 def decode_str_from_stream(stream: BytesIO | BufferedReader) -> str:
     if not isinstance(stream, (BytesIO, BufferedReader)):
         raise TypeError(f"Expected BytesIO or BufferedReader, got {type(stream)}")
-    length_str = b""
-    while True:
-        byte = stream.read(1)
-        if not byte:
-            raise ValueError("Unterminated string length")
-        if byte == b":":
-            break
-        length_str += byte
-    length = int(length_str)
-    buf = stream.read(length)
-    return buf.decode()
+    return _decode_stream(stream, _decode_str)
 
 
 def decode_int_from_stream(
@@ -83,40 +210,13 @@ def decode_int_from_stream(
 ) -> int:
     if not isinstance(stream, (BytesIO, BufferedReader)):
         raise TypeError(f"Expected BytesIO or BufferedReader, got {type(stream)}")
-    if skip_signature:
-        stream.read(1)  # skip signature (i)
-    num_str = b""
-    while True:
-        byte = stream.read(1)
-        if not byte:
-            raise ValueError("Unterminated integer")
-        if byte == b"e":
-            return int(num_str)
-        num_str += byte
+    return _decode_stream(stream, _decode_int, int(skip_signature))
 
 
 def decode_from_stream(stream: BytesIO | BufferedReader) -> SupportedTypes:
     if not isinstance(stream, (BytesIO, BufferedReader)):
         raise TypeError(f"Expected BytesIO or BufferedReader, got {type(stream)}")
-    byte = stream.read(1)
-    if not byte:
-        raise ValueError("Unexpected end of file")
-    if byte == b"i":
-        return decode_int_from_stream(stream, skip_signature=False)
-    elif byte == b"l":
-        return decode_list_from_stream(stream, skip_signature=False)
-    elif byte == b"d":
-        return decode_dict_from_stream(stream, skip_signature=False)
-    elif byte.isdigit():
-        stream.seek(-1, SEEK_CUR)
-        pos = stream.tell()
-        try:
-            return decode_str_from_stream(stream)
-        except UnicodeDecodeError:
-            stream.seek(pos, SEEK_SET)
-            return decode_bytes_from_stream(stream)
-    else:
-        raise ValueError(f"Invalid bencode byte: {byte}")
+    return _decode_stream(stream, _decode)
 
 
 def decode_list_from_stream(
@@ -124,59 +224,27 @@ def decode_list_from_stream(
 ) -> list[SupportedTypes]:
     if not isinstance(stream, (BytesIO, BufferedReader)):
         raise TypeError(f"Expected BytesIO or BufferedReader, got {type(stream)}")
-    if skip_signature:
-        stream.read(1)  # skip signature (l)
-    items = []
-    while True:
-        pos = stream.tell()
-        byte = stream.read(1)
-        if byte == b"e":
-            break
-        stream.seek(pos)
-        items.append(decode_from_stream(stream))
-    return items
+    return _decode_stream(stream, _decode_list, int(skip_signature))
 
 
 def decode_dict_from_stream(
     stream: BytesIO | BufferedReader, skip_signature: bool = True
-) -> dict[str, SupportedTypes]:
+) -> dict[bytes, SupportedTypes]:
     if not isinstance(stream, (BytesIO, BufferedReader)):
         raise TypeError(f"Expected BytesIO or BufferedReader, got {type(stream)}")
-    if skip_signature:
-        stream.read(1)  # skip signature (d)
-    data = {}
-    while True:
-        pos = stream.tell()
-        byte = stream.read(1)
-        if byte == b"e":
-            break
-        stream.seek(pos)
-        key = decode_from_stream(stream)
-        value = decode_from_stream(stream)
-        data[key] = value
-    return data
+    return _decode_stream(stream, _decode_dict, int(skip_signature))
 
 
 def decode_bytes_from_stream(stream: BytesIO | BufferedReader) -> bytes:
     if not isinstance(stream, (BytesIO, BufferedReader)):
         raise TypeError(f"Expected BytesIO or BufferedReader, got {type(stream)}")
-    length_str = b""
-    while True:
-        byte = stream.read(1)
-        if not byte:
-            raise ValueError("Unterminated bytes length")
-        if byte == b":":
-            break
-        length_str += byte
-    length = int(length_str)
-    buf = stream.read(length)
-    return buf
+    return _decode_stream(stream, _decode_bytes)
 
 
 def decode_str_from_bytes(value: bytes) -> str:
     if not isinstance(value, bytes):
         raise TypeError(f"Expected bytes, got {type(value)}")
-    return decode_str_from_stream(BytesIO(value))
+    return _decode_str(value, 0)[0]
 
 
 def decode_str(value: bytes) -> str:
@@ -186,7 +254,7 @@ def decode_str(value: bytes) -> str:
 def decode_int_from_bytes(value: bytes) -> int:
     if not isinstance(value, bytes):
         raise TypeError(f"Expected bytes, got {type(value)}")
-    return decode_int_from_stream(BytesIO(value))
+    return _decode_int(value, 1)[0]
 
 
 def decode_int(value: bytes) -> int:
@@ -196,27 +264,31 @@ def decode_int(value: bytes) -> int:
 def decode_list_from_bytes(value: bytes) -> list[SupportedTypes]:
     if not isinstance(value, bytes):
         raise TypeError(f"Expected bytes, got {type(value)}")
-    return decode_list_from_stream(BytesIO(value))
+    return _decode_list(value, 1)[0]
 
 
 def decode_list(value: bytes) -> list[SupportedTypes]:
     return decode_list_from_bytes(value)
 
 
-def decode_dict_from_bytes(value: bytes) -> dict[str, SupportedTypes]:
+def decode_dict_from_bytes(value: bytes) -> dict[bytes, SupportedTypes]:
     if not isinstance(value, bytes):
         raise TypeError(f"Expected bytes, got {type(value)}")
-    return decode_dict_from_stream(BytesIO(value))
+    if better_bencode is not None:
+        return better_bencode.loads(value)
+    if decode_fast is not None:
+        return decode_fast(value)
+    return _decode_dict(value, 1)[0]
 
 
-def decode_dict(value: bytes) -> dict[str, SupportedTypes]:
+def decode_dict(value: bytes) -> dict[bytes, SupportedTypes]:
     return decode_dict_from_bytes(value)
 
 
 def decode_bytes_from_bytes(value: bytes) -> bytes:
     if not isinstance(value, bytes):
         raise TypeError(f"Expected bytes, got {type(value)}")
-    return decode_bytes_from_stream(BytesIO(value))
+    return _decode_bytes(value, 0)[0]
 
 
 def decode_bytes(value: bytes) -> bytes:
@@ -226,14 +298,18 @@ def decode_bytes(value: bytes) -> bytes:
 def decode_from_bytes(value: bytes) -> SupportedTypes:
     if not isinstance(value, bytes):
         raise TypeError(f"Expected bytes, got {type(value)}")
-    return decode_from_stream(BytesIO(value))
+    if better_bencode is not None:
+        return better_bencode.loads(value)
+    if decode_fast is not None:
+        return decode_fast(value)
+    return _decode(value, 0)[0]
 
 
 def decode(value: bytes) -> SupportedTypes:
     return decode_from_bytes(value)
 
 
-def decode_from_torrent_file(file_path: str | Path) -> dict[str, SupportedTypes]:
+def decode_from_torrent_file(file_path: str | Path) -> dict[bytes, SupportedTypes]:
     if not isinstance(file_path, (str, Path)):
         raise TypeError(f"Expected str or Path, got {type(file_path)}")
     file_path = Path(file_path)
@@ -0,0 +1,134 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+"""
+Cython implementation of the bencode decoder used by bencode.py.
+
+Build it in place with `cythonize -i bencode_fast.pyx`. When the extension is not built, bencode.py falls back to the pure Python decoder.
+"""
+
+from cpython.bytes cimport PyBytes_FromStringAndSize
+from cpython.dict cimport PyDict_SetItem
+
+cdef enum:
+    MINUS = 45  # -
+    COLON = 58  # :
+    DIGIT_0 = 48
+    DIGIT_9 = 57
+    SIG_INT = 105  # i
+    SIG_LIST = 108  # l
+    SIG_DICT = 100  # d
+    SIG_END = 101  # e
+    MAX_DIGITS = 18  # fits in a long long
+    MAX_DEPTH = 1000  # nested lists/dicts, keeps the C recursion bounded
+
+
+cdef Py_ssize_t _decode_length(
+    const unsigned char *p, Py_ssize_t n, Py_ssize_t *i
+) except -1:
+    cdef Py_ssize_t j = i[0]
+    cdef Py_ssize_t length = 0
+    while j < n and p[j] != COLON:
+        if p[j] < DIGIT_0 or p[j] > DIGIT_9 or j - i[0] >= MAX_DIGITS:
+            raise ValueError("Invalid string length")
+        length = length * 10 + (p[j] - DIGIT_0)
+        j += 1
+    if j >= n:
+        raise ValueError("Unterminated string length")
+    i[0] = j + 1
+    return length
+
+
+cdef bytes _decode_bytes(const unsigned char *p, Py_ssize_t n, Py_ssize_t *i):
+    cdef Py_ssize_t length = _decode_length(p, n, i)
+    cdef Py_ssize_t start = i[0]
+    if length > n - start:
+        raise ValueError("Unexpected end of file")
+    i[0] = start + length
+    return PyBytes_FromStringAndSize(<char *>(p + start), length)
+
+
+cdef object _decode_int(const unsigned char *p, Py_ssize_t n, Py_ssize_t *i):
+    cdef Py_ssize_t start = i[0]
+    cdef Py_ssize_t j = start
+    cdef long long value = 0
+    cdef bint negative = False
+    if j < n and p[j] == MINUS:
+        negative = True
+        j += 1
+        start += 1
+    while j < n and p[j] != SIG_END:
+        if p[j] < DIGIT_0 or p[j] > DIGIT_9:
+            raise ValueError("Invalid integer")
+        j += 1
+    if j >= n:
+        raise ValueError("Unterminated integer")
+    if j == start:
+        raise ValueError("Invalid integer")
+    i[0] = j + 1
+    if j - start > MAX_DIGITS:
+        value_obj = int(p[start:j])
+        return -value_obj if negative else value_obj
+    while start < j:
+        value = value * 10 + (p[start] - DIGIT_0)
+        start += 1
+    return -value if negative else value
+
+
+cdef list _decode_list(
+    const unsigned char *p, Py_ssize_t n, Py_ssize_t *i, int depth
+):
+    cdef list items = []
+    while True:
+        if i[0] >= n:
+            raise ValueError("Unexpected end of file")
+        if p[i[0]] == SIG_END:
+            i[0] += 1
+            return items
+        items.append(_decode(p, n, i, depth))
+
+
+cdef dict _decode_dict(
+    const unsigned char *p, Py_ssize_t n, Py_ssize_t *i, int depth
+):
+    cdef dict items = {}
+    while True:
+        if i[0] >= n:
+            raise ValueError("Unexpected end of file")
+        if p[i[0]] == SIG_END:
+            i[0] += 1
+            return items
+        if p[i[0]] < DIGIT_0 or p[i[0]] > DIGIT_9:
+            raise ValueError("Invalid dictionary key")
+        key = _decode_bytes(p, n, i)
+        value = _decode(p, n, i, depth)
+        PyDict_SetItem(items, key, value)
+
+
+cdef object _decode(
+    const unsigned char *p, Py_ssize_t n, Py_ssize_t *i, int depth
+):
+    cdef unsigned char byte
+    if i[0] >= n:
+        raise ValueError("Unexpected end of file")
+    byte = p[i[0]]
+    if byte == SIG_INT:
+        i[0] += 1
+        return _decode_int(p, n, i)
+    elif byte == SIG_LIST:
+        i[0] += 1
+        if depth >= MAX_DEPTH:
+            raise ValueError("Nesting too deep")
+        return _decode_list(p, n, i, depth + 1)
+    elif byte == SIG_DICT:
+        i[0] += 1
+        if depth >= MAX_DEPTH:
+            raise ValueError("Nesting too deep")
+        return _decode_dict(p, n, i, depth + 1)
+    elif DIGIT_0 <= byte <= DIGIT_9:
+        return _decode_bytes(p, n, i)
+    raise ValueError(f"Invalid bencode byte: {bytes([byte])}")
+
+
+cpdef decode(bytes value):
+    cdef const unsigned char *p = value
+    cdef Py_ssize_t i = 0
+    return _decode(p, len(value), &i, 0)
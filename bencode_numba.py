@@ -0,0 +1,114 @@
+"""
+A Numba-compiled bencode decoder.
+
+The compiled core scans the input as a uint8 array and produces a flat list of tokens (type, payload start, payload end, parent token), the Python side then walks the tokens once to build the nested lists and dictionaries.
+Importing this module raises ImportError when numba or numpy are not installed.
+"""
+
+import numpy as np
+from numba import njit
+
+TOKEN_INT = 0
+TOKEN_STR = 1
+TOKEN_LIST = 2
+TOKEN_DICT = 3
+
+MAX_DIGITS = 18  # fits in an int64
+
+
+@njit(cache=True, boundscheck=False)
+def _scan(data):
+    n = data.shape[0]
+    tags = np.empty(n, np.int8)
+    starts = np.empty(n, np.int64)
+    ends = np.empty(n, np.int64)
+    parents = np.empty(n, np.int64)
+    stack = np.empty(n, np.int64)
+    depth = 0
+    count = 0
+    i = 0
+    while i < n:
+        c = data[i]
+        if c == 101:  # e
+            if depth == 0:
+                raise ValueError("Invalid bencode byte")
+            depth -= 1
+            i += 1
+            if depth == 0:
+                break
+            continue
+        parents[count] = stack[depth - 1] if depth > 0 else -1
+        if c == 105:  # i
+            j = i + 1
+            while j < n and data[j] != 101:
+                j += 1
+            if j >= n:
+                raise ValueError("Unterminated integer")
+            tags[count] = TOKEN_INT
+            starts[count] = i + 1
+            ends[count] = j
+            i = j + 1
+        elif 48 <= c <= 57:  # 0-9
+            length = 0
+            j = i
+            while j < n and data[j] != 58:
+                digit = np.int64(data[j]) - 48
+                if digit < 0 or digit > 9 or j - i >= MAX_DIGITS:
+                    raise ValueError("Invalid string length")
+                length = length * 10 + digit
+                j += 1
+            if j >= n:
+                raise ValueError("Unterminated string length")
+            if length > n - (j + 1):
+                raise ValueError("Unexpected end of file")
+            tags[count] = TOKEN_STR
+            starts[count] = j + 1
+            ends[count] = j + 1 + length
+            i = ends[count]
+        elif c == 108 or c == 100:  # l, d
+            tags[count] = TOKEN_LIST if c == 108 else TOKEN_DICT
+            starts[count] = i
+            ends[count] = i
+            stack[depth] = count
+            depth += 1
+            i += 1
+        else:
+            raise ValueError("Invalid bencode byte")
+        count += 1
+        if depth == 0:
+            break
+    if depth > 0 or count == 0:
+        raise ValueError("Unexpected end of file")
+    return tags[:count], starts[:count], ends[:count], parents[:count]
+
+
+def decode(value: bytes):
+    tags, starts, ends, parents = _scan(np.frombuffer(value, dtype=np.uint8))
+    containers = {}
+    pending_keys = {}
+    root = None
+    for index, (tag, start, end, parent) in enumerate(
+        zip(tags.tolist(), starts.tolist(), ends.tolist(), parents.tolist())
+    ):
+        if tag == TOKEN_INT:
+            item = int(value[start:end])
+        elif tag == TOKEN_STR:
+            item = value[start:end]
+        else:
+            item = [] if tag == TOKEN_LIST else {}
+            containers[index] = item
+        if parent < 0:
+            root = item
+            continue
+        container = containers[parent]
+        if type(container) is list:
+            container.append(item)
+        elif parent in pending_keys:
+            container[pending_keys.pop(parent)] = item
+        elif type(item) is bytes:
+            pending_keys[parent] = item
+        else:
+            raise ValueError("Invalid dictionary key")
+    if pending_keys:
+        raise ValueError("Missing dictionary value")
+    return root
@@ -4,10 +4,26 @@ import bencode
 import util
 import asyncudp
 import asyncio
+import functools
+import socket
+from typing import Protocol
 
 type NodeID = bytes
 type NodeAddr = tuple[str, int]
-type NodeSocket = asyncudp.Socket
+
+
+class UdpTransport(Protocol):
+    def sendto(self, data: bytes, addr: NodeAddr | None = None) -> None: ...
+
+    async def recvfrom(self) -> tuple[bytes, NodeAddr]: ...
+
+    def close(self) -> None: ...
+
+
+# Sessions send a handful of one-shot queries, so a node keeps them on plain
+# asyncudp sockets shared by all of its sessions. Batched receive is only
+# worth its setup for the long-lived listening socket in server.py.
+type NodeSocket = UdpTransport
 
 BOOTSTRAP_NODES = [
     ("router.bittorrent.com", 6881),
@@ -15,36 +31,119 @@ BOOTSTRAP_NODES = [
     ("127.0.0.1", 6881),
 ]
 
+# Sessions are short exchanges (a bootstrap ping, a find_node), so all
+# queries of a session share one deadline instead of a timeout each.
+SESSION_TIMEOUT = 5.0
+
 
 class Node:
+    __slots__ = ("node_id", "_socks", "_receivers", "_sock_lock", "_pending")
+
     def __init__(self, node_id: NodeID):
         self.node_id: NodeID = node_id
+        # one shared socket and receive task per address family
+        self._socks: dict[int, NodeSocket] = {}
+        self._receivers: dict[int, asyncio.Task] = {}
+        self._sock_lock = asyncio.Lock()
+        self._pending: dict[tuple[NodeAddr, bytes], asyncio.Future] = {}
 
     async def connect(self, addr: NodeAddr) -> Session:
         return await Session.create(self, addr)
 
-    async def bootstrap(self) -> list[NodeAddr]:
-        active_nodes = []
-        for addr in BOOTSTRAP_NODES:
+    async def close(self) -> None:
+        for receiver in self._receivers.values():
+            receiver.cancel()
+        for sock in self._socks.values():
+            sock.close()
+        self._receivers.clear()
+        self._socks.clear()
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError("Node closed"))
+        self._pending.clear()
+
+    async def _shared_sock(self, family: int) -> NodeSocket:
+        async with self._sock_lock:
+            receiver = self._receivers.get(family)
+            if receiver is None or receiver.done():
+                if family in self._socks:
+                    self._socks[family].close()
+                host = "::" if family == socket.AF_INET6 else "0.0.0.0"
+                sock = await asyncudp.create_socket(local_addr=(host, 0))
+                self._socks[family] = sock
+                self._receivers[family] = asyncio.create_task(self._receive(sock))
+        return self._socks[family]
+
+    async def _receive(self, sock: NodeSocket) -> None:
+        # replies from every session arrive here and are matched by sender
+        # address and transaction id
+        while True:
             try:
-                async with await self.connect(addr) as session:
-                    await session.ping()
-                    active_nodes.append(addr)
-            except (TimeoutError, OSError):
+                data, addr = await sock.recvfrom()
+                decoded = bencode.decode_dict(data)
+                future = self._pending.get((addr[:2], decoded[b"t"]))
+            except asyncudp.ClosedError:
+                # asyncudp also reports a failed send this way while the
+                # socket stays usable, stop only once the socket is really
+                # closed so that _shared_sock opens a new one
+                if sock._transport.is_closing():
+                    return
+                continue
+            except (ValueError, TypeError, KeyError, RecursionError, OSError):
+                # malformed datagrams and failed sends
                 continue
-        return active_nodes
+            if future is not None and not future.done():
+                future.set_result(decoded)
+
+    async def _query(
+        self, sock: NodeSocket, addr: NodeAddr, query: Query, deadline: float
+    ) -> dict[bytes, bencode.SupportedTypes]:
+        key = (addr[:2], query.t)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            sock.sendto(query.serialized, addr)
+            async with asyncio.timeout_at(deadline):
+                return await future
+        finally:
+            self._pending.pop(key, None)
+
+    async def _try_bootstrap(self, addr: NodeAddr) -> None:
+        async with await self.connect(addr) as session:
+            await session.ping()
+
+    async def bootstrap(self) -> list[NodeAddr]:
+        # any failure (timeout, unreachable, malformed or error reply) only
+        # marks that bootstrap node as inactive
+        results = await asyncio.gather(
+            *(self._try_bootstrap(addr) for addr in BOOTSTRAP_NODES),
+            return_exceptions=True,
+        )
+        return [
+            addr
+            for addr, result in zip(BOOTSTRAP_NODES, results)
+            if not isinstance(result, BaseException)
+        ]
 
 
 class Session:
+    __slots__ = ("node", "sock", "addr", "deadline")
+
     def __init__(self, node: Node, sock: NodeSocket, addr: NodeAddr):
         self.node: Node = node
         self.sock: NodeSocket = sock
         self.addr: NodeAddr = addr
+        self.deadline: float = asyncio.get_running_loop().time() + SESSION_TIMEOUT
 
     @classmethod
     async def create(cls: Session, node: Node, addr: NodeAddr) -> Session:
-        sock = await asyncudp.create_socket(remote_addr=addr)
-        return cls(node, sock, addr)
+        # the shared socket is not connected, so resolve the address up front
+        infos = await asyncio.get_running_loop().getaddrinfo(
+            *addr, type=socket.SOCK_DGRAM
+        )
+        family, *_, sockaddr = infos[0]
+        sock = await node._shared_sock(family)
+        return cls(node, sock, sockaddr)
 
     async def __aenter__(self) -> Session:
         return self
@@ -53,13 +152,11 @@ class Session:
         await self.close()
 
     async def close(self) -> None:
-        if self.sock:
-            self.sock.close()
+        # the socket belongs to the node and is closed by Node.close
+        pass
 
-    async def _send_query(self, query: Query) -> dict[str, bencode.SupportedTypes]:
-        self.sock.sendto(query.serialized)
-        data, _ = await asyncio.wait_for(self.sock.recvfrom(), timeout=5.0)
-        return bencode.decode_dict(data)
+    async def _send_query(self, query: Query) -> dict[bytes, bencode.SupportedTypes]:
+        return await self.node._query(self.sock, self.addr, query, self.deadline)
 
     async def ping(self) -> Response:
         try:
@@ -79,21 +176,45 @@ class Session:
 
 
 class Response:
-    def __init__(self, decoded: dict[str, bencode.SupportedTypes]):
-        self.id: NodeID = decoded["r"]["id"]
-        self.t: bytes = decoded["t"]
+    __slots__ = ("id", "t")
+
+    def __init__(self, decoded: dict[bytes, bencode.SupportedTypes]):
+        self.id: NodeID = decoded[b"r"][b"id"]
+        self.t: bytes = decoded[b"t"]
 
     def __repr__(self):
-        return str(self.__dict__)
+        fields = {
+            name: getattr(self, name)
+            for cls in reversed(type(self).__mro__)
+            for name in getattr(cls, "__slots__", ())
+        }
+        return str(fields)
 
 
 class FindNodeResponse(Response):
-    def __init__(self, decoded: dict[str, bencode.SupportedTypes]):
+    __slots__ = ("nodes",)
+
+    def __init__(self, decoded: dict[bytes, bencode.SupportedTypes]):
         super().__init__(decoded)
-        self.nodes = decoded["r"]["nodes"]
+        self.nodes = decoded[b"r"][b"nodes"]
+
+
+@functools.cache
+def _query_template(
+    method: str, arg_keys: tuple[str, ...]
+) -> tuple[tuple[bytes, ...], bytes]:
+    # bencoded pieces around the per-packet values, in key order: "a" opens
+    # with "id", which sorts before every other KRPC argument, then the "a"
+    # dict closes and q, t follow
+    keys = tuple(bencode.encode_str(key) for key in arg_keys)
+    tail = b"e1:q" + bencode.encode_str(method) + b"1:t"
+    return keys, tail
 
 
 class Query:
+    __slots__ = ("t", "y", "q", "a")
+    arg_keys: tuple[str, ...] = ()
+
     def __init__(self, node_id: NodeID, method: str):
         self.t = util.generate_transaction_id()
         self.y = "q"
@@ -102,15 +223,29 @@ class Query:
 
     @property
     def serialized(self) -> bytes:
-        return bencode.encode_dict(self.__dict__)
+        keys, tail = _query_template(self.q, self.arg_keys)
+        buf = bytearray(b"d1:ad2:id")
+        buf += bencode.encode_bytes(self.a["id"])
+        for key, name in zip(keys, self.arg_keys):
+            buf += key
+            buf += bencode.encode_bytes(self.a[name])
+        buf += tail
+        buf += bencode.encode_bytes(self.t)
+        buf += b"1:y1:qe"
+        return bytes(buf)
 
 
 class PingQuery(Query):
+    __slots__ = ()
+
     def __init__(self, node_id: NodeID):
         super().__init__(node_id, "ping")
 
 
 class FindNodeQuery(Query):
+    __slots__ = ()
+    arg_keys = ("target",)
+
     def __init__(self, node_id: NodeID, target_id: NodeID):
         super().__init__(node_id, "find_node")
         self.a["target"] = target_id
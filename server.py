@@ -1,98 +1,142 @@
 import asyncio
-import asyncudp
 import bencode
+import socket
 import util
 
 NODE_ID = util.generate_node_id()
 
+MAX_PACKET_SIZE = 65535
+RECV_BATCH_SIZE = 64
 
-def is_ping_packet(packet: dict[str, bencode.SupportedTypes]) -> bool:
-    return packet["y"] == "q" and packet["q"] == "ping"
+# Responses are {"r": {...}, "t": ..., "y": "r"}: everything around the
+# transaction id (and the find_node nodes) is the same for every packet.
+RESPONSE_SUFFIX = b"1:y1:re"
+PING_RESPONSE_PREFIX = b"d1:r" + bencode.encode_dict({"id": NODE_ID}) + b"1:t"
+FIND_NODE_RESPONSE_PREFIX = b"d1:rd2:id" + bencode.encode_bytes(NODE_ID) + b"5:nodes"
 
 
-def is_find_node_packet(packet: dict[str, bencode.SupportedTypes]) -> bool:
-    return packet["y"] == "q" and packet["q"] == "find_node"
+def get_query_handler(packet: dict[bytes, bencode.SupportedTypes]):
+    method = packet.get(b"q")
+    if packet.get(b"y") != b"q" or not isinstance(method, bytes):
+        return None
+    return QUERY_HANDLERS.get(method)
 
 
-def is_get_peers_packet(packet: dict[str, bencode.SupportedTypes]) -> bool:
-    return packet["y"] == "q" and packet["q"] == "get_peers"
-
-
-def is_announce_peer_packet(packet: dict[str, bencode.SupportedTypes]) -> bool:
-    return packet["y"] == "q" and packet["q"] == "announce_peer"
-
-
-async def handle_query(sock: asyncudp.Socket, data: bytes, addr: tuple[str, int]):
+async def handle_query(sock: socket.socket, data: bytes, addr: tuple[str, int]):
     packet = bencode.decode_dict(data)
 
     print(f"[QUERY] {addr}: {packet}")
 
-    if is_ping_packet(packet):
-        handle_ping(sock, packet, addr)
-    elif is_find_node_packet(packet):
-        handle_find_node(sock, packet, addr)
-    elif is_get_peers_packet(packet):
-        handle_get_peers(sock, packet, addr)
-    elif is_announce_peer_packet(packet):
-        handle_announce_peer(sock, packet, addr)
-    else:
+    handler = get_query_handler(packet)
+    if handler is None:
         handle_error(sock, packet, addr, 204, "Method Unknown")
+    else:
+        handler(sock, packet, addr)
+
+
+def send_response(sock: socket.socket, data: bytes, addr: tuple[str, int]):
+    try:
+        sock.sendto(data, addr)
+    except BlockingIOError:
+        # the send buffer is full, drop the reply like a lost datagram
+        pass
 
 
 def handle_ping(
-    sock: asyncudp.Socket,
-    packet: dict[str, bencode.SupportedTypes],
+    sock: socket.socket,
+    packet: dict[bytes, bencode.SupportedTypes],
     addr: tuple[str, int],
 ):
-    response = {"t": packet["t"], "y": "r", "r": {"id": NODE_ID}}
-    sock.sendto(bencode.encode_dict(response), addr)
+    response = PING_RESPONSE_PREFIX + bencode.encode(packet[b"t"]) + RESPONSE_SUFFIX
+    send_response(sock, response, addr)
 
 
 def handle_find_node(
-    sock: asyncudp.Socket,
-    packet: dict[str, bencode.SupportedTypes],
+    sock: socket.socket,
+    packet: dict[bytes, bencode.SupportedTypes],
     addr: tuple[str, int],
 ):
     # TODO nodes implementation
-    response = {"t": packet["t"], "y": "r", "r": {"id": NODE_ID, "nodes": []}}
-    sock.sendto(bencode.encode_dict(response), addr)
+    nodes = []
+    response = (
+        FIND_NODE_RESPONSE_PREFIX
+        + bencode.encode_list(nodes)
+        + b"e1:t"
+        + bencode.encode(packet[b"t"])
+        + RESPONSE_SUFFIX
+    )
+    send_response(sock, response, addr)
 
 
 def handle_get_peers(
-    sock: asyncudp.Socket,
-    packet: dict[str, bencode.SupportedTypes],
+    sock: socket.socket,
+    packet: dict[bytes, bencode.SupportedTypes],
     addr: tuple[str, int],
 ):
     pass
 
 
 def handle_announce_peer(
-    sock: asyncudp.Socket,
-    packet: dict[str, bencode.SupportedTypes],
+    sock: socket.socket,
+    packet: dict[bytes, bencode.SupportedTypes],
     addr: tuple[str, int],
 ):
     pass
 
 
 def handle_error(
-    sock: asyncudp.Socket,
-    packet: dict[str, bencode.SupportedTypes],
+    sock: socket.socket,
+    packet: dict[bytes, bencode.SupportedTypes],
     addr: tuple[str, int],
     error_code: int,
     error_message: str,
 ):
-    error = {"t": packet["t"], "y": "e", "e": [error_code, error_message]}
-    sock.sendto(bencode.encode_dict(error), addr)
+    error = {"t": packet[b"t"], "y": "e", "e": [error_code, error_message]}
+    send_response(sock, bencode.encode_dict(error), addr)
+
+
+QUERY_HANDLERS = {
+    b"ping": handle_ping,
+    b"find_node": handle_find_node,
+    b"get_peers": handle_get_peers,
+    b"announce_peer": handle_announce_peer,
+}
+
+
+def recv_batch(
+    sock: socket.socket, buf: memoryview
+) -> list[tuple[bytes, tuple[str, int]]]:
+    packets = []
+    for _ in range(RECV_BATCH_SIZE):
+        try:
+            size, addr = sock.recvfrom_into(buf)
+        except BlockingIOError:
+            break
+        packets.append((bytes(buf[:size]), addr))
+    return packets
 
 
 async def udp_server():
-    sock = await asyncudp.create_socket(local_addr=("127.0.0.1", 6881))
+    loop = asyncio.get_running_loop()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setblocking(False)
+    sock.bind(("127.0.0.1", 6881))
+
+    buf = memoryview(bytearray(MAX_PACKET_SIZE))
+    readable = asyncio.Event()
+    loop.add_reader(sock.fileno(), readable.set)
 
     print(f"Node ({NODE_ID.hex()}) has been started")
 
-    while True:
-        data, addr = await sock.recvfrom()
-        await handle_query(sock, data, addr)
+    try:
+        while True:
+            await readable.wait()
+            readable.clear()
+            for data, addr in recv_batch(sock, buf):
+                await handle_query(sock, data, addr)
+    finally:
+        loop.remove_reader(sock.fileno())
+        sock.close()
 
 
 asyncio.run(udp_server())
@@ -9,6 +9,8 @@ async def main():
 
     active_nodes = await node.bootstrap()
 
+    await node.close()
+
     print(active_nodes)
 
 
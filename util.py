@@ -1,12 +1,17 @@
-import hashlib
+import itertools
+import random
 import secrets
-import time
+
+TRANSACTION_ID_LENGTH = 4
+
+_transaction_ids = itertools.count(random.getrandbits(TRANSACTION_ID_LENGTH * 8))
 
 
 def generate_node_id() -> bytes:
-    data = f"{secrets.token_hex(32)}-{time.time()}"
-    return hashlib.sha1(data.encode()).digest()
+    return secrets.token_bytes(20)
 
 
 def generate_transaction_id() -> bytes:
-    return secrets.token_bytes(4)
+    # transaction ids only need to be unique among in-flight queries
+    n = next(_transaction_ids) & 0xFFFFFFFF
+    return n.to_bytes(TRANSACTION_ID_LENGTH, "big")